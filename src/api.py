@@ -0,0 +1,370 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import rag_utils
+import report
+import routing
+import warmup
+
+
+"""This file exposes the application logic as a headless JSON/SSE API.
+Long runs are started as jobs and polled by job ID, \
+    or followed as server-sent events for each workflow stage.
+Job state lives on disk so several uvicorn workers can share it.
+Example usage (from the src directory):
+uvicorn api:app --workers 4 --port 8000
+The same routes are also served by the NiceGUI app in gui.py under /api.
+"""
+
+# Directory shared by all workers for job records and idempotency keys.
+# Override with PERMIT_PAL_CACHE_DIR when workers run on different paths.
+CACHE_DIR = Path(os.getenv(
+    "PERMIT_PAL_CACHE_DIR",
+    Path(__file__).resolve().parent.parent / ".cache"
+))
+JOBS_DIR = CACHE_DIR / "jobs"
+IDEMPOTENCY_DIR = CACHE_DIR / "idempotency"
+
+# How often the SSE stream checks the job record for new events
+SSE_POLL_SECONDS = 0.5
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+# A running job rewrites its record at least this often,
+# so a record that is not updated for STALE_JOB_SECONDS has lost its worker
+HEARTBEAT_SECONDS = 30
+STALE_JOB_SECONDS = 4 * HEARTBEAT_SECONDS
+
+# Job records and idempotency keys older than this are deleted
+JOB_TTL_SECONDS = 24 * 60 * 60
+CLEANUP_INTERVAL_SECONDS = 10 * 60
+_last_cleanup = 0.0
+
+# Keeps references to running jobs so they are not garbage collected
+_running_jobs: set[asyncio.Task] = set()
+
+router = APIRouter(prefix="/api")
+
+
+class ReportRequest(BaseModel):
+    """Request body for a report job. Mirrors the CLI arguments."""
+    prompt: str = Field(min_length=1)
+    llm_model: str
+    rag: bool = False
+    routing: str = "single"
+    backup_model: Optional[str] = None
+
+
+class RelevancyRequest(BaseModel):
+    """Request body for a RAG relevancy job."""
+    prompt: str = Field(min_length=1)
+
+
+def _job_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def read_job(job_id: str) -> Optional[dict]:
+    """Returns the stored job record, or None if the job does not exist.
+    A job whose worker stopped updating it is returned as failed.
+    """
+    # Job IDs are hex strings; anything else cannot name a job file
+    if not job_id.isalnum():
+        return None
+    try:
+        job = json.loads(_job_path(job_id).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    if job["status"] not in TERMINAL_STATUSES \
+            and time.time() - job["updated"] > STALE_JOB_SECONDS:
+        job["status"] = "failed"
+        job["error"] = "The worker running the job stopped."
+        job["events"].append(
+            {"stage": "failed", "data": {}, "time": job["updated"]}
+        )
+    return job
+
+
+def write_job(job: dict) -> None:
+    """Writes the job record atomically so readers in other workers \
+        never see a partially written file.
+    """
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    job["updated"] = time.time()
+    tmp_path = JOBS_DIR / f"{job['job_id']}.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(job), encoding="utf-8")
+    os.replace(tmp_path, _job_path(job["job_id"]))
+
+
+async def claim_idempotency_key(
+    key: str,
+    job_id: str,
+    fingerprint: str
+) -> dict:
+    """Maps an idempotency key to a job ID, shared across workers.
+    The mapping is written to a temporary file and linked into place, \
+        which fails if the key exists, so only the first request wins \
+        and readers never see a partially written key.
+    Returns the stored mapping, which belongs to an earlier job \
+        if the key was already used.
+    """
+    IDEMPOTENCY_DIR.mkdir(parents=True, exist_ok=True)
+    key_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    key_path = IDEMPOTENCY_DIR / f"{key_hash}.json"
+    claim = {"job_id": job_id, "fingerprint": fingerprint}
+    tmp_path = IDEMPOTENCY_DIR / f"{key_hash}.{job_id}.tmp"
+    tmp_path.write_text(json.dumps(claim), encoding="utf-8")
+    try:
+        # Retried in case the existing key expires while it is read
+        for _ in range(3):
+            try:
+                os.link(tmp_path, key_path)
+                return claim
+            except FileExistsError:
+                pass
+            try:
+                return json.loads(key_path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, json.JSONDecodeError):
+                await asyncio.sleep(0.05)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    raise HTTPException(
+        status_code=503,
+        detail="Could not claim the Idempotency-Key, please retry."
+    )
+
+
+def cleanup_expired() -> None:
+    """Deletes job records and idempotency keys older than JOB_TTL_SECONDS.
+    Runs at most once every CLEANUP_INTERVAL_SECONDS in each worker.
+    """
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+        return
+    _last_cleanup = now
+    for directory in (JOBS_DIR, IDEMPOTENCY_DIR):
+        if not directory.is_dir():
+            continue
+        for path in directory.iterdir():
+            try:
+                if now - path.stat().st_mtime > JOB_TTL_SECONDS:
+                    path.unlink()
+            except FileNotFoundError:
+                # Already deleted by another worker
+                pass
+
+
+async def _run_job(job: dict, work) -> None:
+    """Runs the work coroutine factory for a job and records its progress.
+    work receives a progress callback and returns the job result.
+    """
+    def progress(stage: str, data: dict) -> None:
+        job["events"].append(
+            {"stage": stage, "data": data, "time": time.time()}
+        )
+        write_job(job)
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            write_job(job)
+
+    job["status"] = "running"
+    progress("started", {})
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        job["result"] = await work(progress)
+        job["status"] = "succeeded"
+    except Exception as e:
+        print(f"Job {job['job_id']} failed: {e!r}")
+        job["error"] = "An error occurred while running the job."
+        job["status"] = "failed"
+    finally:
+        heartbeat_task.cancel()
+    progress(job["status"], {})
+
+
+async def start_job(
+    kind: str,
+    request: BaseModel,
+    work,
+    idempotency_key
+) -> dict:
+    """Creates a job record and starts it in the background.
+    If the idempotency key was already used for the same request, \
+        the existing job is returned instead of starting a new one.
+    """
+    cleanup_expired()
+    body = request.model_dump()
+    fingerprint = hashlib.sha256(
+        json.dumps({"kind": kind, **body}, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "request": body,
+        "events": [],
+        "result": None,
+        "error": None,
+        "created": time.time(),
+    }
+    # The record is written before the key is claimed,
+    # so the winning job is always readable by other workers.
+    write_job(job)
+    if idempotency_key:
+        claim = await claim_idempotency_key(
+            idempotency_key, job["job_id"], fingerprint
+        )
+        if claim["job_id"] != job["job_id"]:
+            _job_path(job["job_id"]).unlink(missing_ok=True)
+            if claim["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Idempotency-Key was already used "
+                           "for a different request."
+                )
+            existing = read_job(claim["job_id"])
+            if existing is None:
+                raise HTTPException(
+                    status_code=409,
+                    detail="The job for this Idempotency-Key has expired."
+                )
+            return existing
+    task = asyncio.create_task(_run_job(job, work))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+    return job
+
+
+@router.get("/models")
+async def list_models() -> list[str]:
+    """Lists the LLM models that can be used for reports."""
+    return report.LLM_MODEL
+
+
+@router.get("/metrics")
+async def get_metrics() -> dict:
+    """Returns per-model latency metrics for this worker process, \
+        including warm-up times and the first-call penalty.
+    """
+    return {"latency": routing.LATENCY.snapshot()}
+
+
+@router.post("/reports", status_code=202)
+async def create_report_job(
+    request: ReportRequest,
+    idempotency_key: Optional[str] = Header(default=None)
+) -> dict:
+    """Starts a report job. Equivalent to report.create_report."""
+    for model in (request.llm_model, request.backup_model):
+        if model is not None and model not in report.LLM_MODEL:
+            raise HTTPException(status_code=422, detail="Invalid LLM model.")
+    try:
+        policy = routing.RoutingPolicy(
+            mode=request.routing,
+            backup_model=request.backup_model
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def work(progress):
+        return await report.create_report(
+            request.prompt,
+            request.llm_model,
+            rag_enabled=request.rag,
+            progress=progress,
+            policy=policy
+        )
+    return await start_job("report", request, work, idempotency_key)
+
+
+@router.post("/relevancy", status_code=202)
+async def create_relevancy_job(
+    request: RelevancyRequest,
+    idempotency_key: Optional[str] = Header(default=None)
+) -> dict:
+    """Starts a RAG relevancy job over the corpus shards named in the prompt.
+    The result has the lists of relevant and non-relevant files.
+    """
+    async def work(progress):
+        result = await rag_utils.run_shards(request.prompt, progress=progress)
+        return {
+            "relevant": result["relevant"],
+            "non_relevant": result["non_relevant"],
+        }
+    return await start_job("relevancy", request, work, idempotency_key)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> dict:
+    """Returns the current state of a job, for polling long runs."""
+    job = read_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    last_event_id: Optional[str] = Header(default=None)
+) -> StreamingResponse:
+    """Streams the progress events of a job as server-sent events.
+    Reconnecting clients resume after the Last-Event-ID they received.
+    The stream ends once the job has succeeded or failed.
+    """
+    if read_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    next_index = 0
+    if last_event_id and last_event_id.isdigit():
+        next_index = int(last_event_id) + 1
+
+    async def event_stream():
+        nonlocal next_index
+        while True:
+            job = read_job(job_id)
+            if job is None:
+                # Deleted after JOB_TTL_SECONDS
+                return
+            for event in job["events"][next_index:]:
+                data = dict(event["data"], time=event["time"])
+                if event["stage"] in TERMINAL_STATUSES:
+                    data.update(result=job["result"], error=job["error"])
+                yield (
+                    f"id: {next_index}\n"
+                    f"event: {event['stage']}\n"
+                    f"data: {json.dumps(data)}\n\n"
+                )
+                next_index += 1
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(SSE_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warms up the Ollama models in the background when a worker starts."""
+    task = asyncio.create_task(warmup.warm_up())
+    yield
+    task.cancel()
+
+
+app = FastAPI(title="Permit Pal API", lifespan=lifespan)
+app.include_router(router)
@@ -1,7 +1,10 @@
-from pathlib import Path
+import asyncio
+from typing import Callable, Optional
+import corpus
 from rel_check import rel_check
 import time
 from workflows.retry_policy import ConstantDelayRetryPolicy
+from llama_index.core.schema import NodeWithScore
 from llama_index.core.workflow import (
     step,
     Context,
@@ -11,6 +14,13 @@ from llama_index.core.workflow import (
     StopEvent,
 )
 
+# Upper bound on relevancy checks running at once in one workflow.
+# The num_workers argument of ConcurrentWorkflow sets the actual limit.
+MAX_WORKERS = 20
+
+# Shards processed at once by ShardedWorkflow
+MAX_CONCURRENT_SHARDS = 8
+
 
 class ProcessEvent(Event):
     """Contains context for concurrent execution of relevancy checking.
@@ -26,18 +36,52 @@ class ResultEvent(Event):
     result: dict[str, str]
 
 
+class ShardEvent(Event):
+    """Contains one shard of the corpus for ShardedWorkflow.
+    shard is the shard name, filenames are the files in the shard.
+    """
+    shard: str
+    filenames: list[str]
+
+
+class ShardResultEvent(Event):
+    """Contains the relevancy and retrieval results of one shard.
+    nodes are the retrieved chunks with their similarity scores.
+    """
+    shard: str
+    relevant: list[str]
+    non_relevant: list[str]
+    nodes: list[NodeWithScore]
+
+
 class ConcurrentWorkflow(Workflow):
     """Class to execute a task multiple times concurrently.
+    filenames are the files to check, all files in corpus.DATA_DIR by default.
+    num_workers limits how many relevancy checks run at once, \
+        up to MAX_WORKERS.
     """
-    def __init__(self, prompt: str, *args, **kwargs):
+    def __init__(
+        self,
+        prompt: str,
+        *args,
+        filenames: Optional[list[str]] = None,
+        num_workers: int = 5,
+        **kwargs
+    ):
+        if not 1 <= num_workers <= MAX_WORKERS:
+            raise ValueError(
+                f"num_workers must be between 1 and {MAX_WORKERS}, "
+                f"got {num_workers}."
+            )
         self.prompt = prompt
+        self.filenames = filenames
+        self.worker_limit = asyncio.Semaphore(num_workers)
         super().__init__(*args, **kwargs)
 
-    # Returns a list of files in a directory
+    # Returns a list of files in a directory and its subdirectories
     @staticmethod
-    def get_filenames(directory_path):
-        path = Path(directory_path)
-        return [directory_path + f.name for f in path.iterdir() if f.is_file()]
+    def get_filenames(directory_path) -> list[str]:
+        return corpus.get_filenames(directory_path)
 
     # Looks at a dictionary, the Value is either Yes or No
     # Returns True if the Value is Yes
@@ -52,12 +96,22 @@ class ConcurrentWorkflow(Workflow):
                 return None
 
     @step
-    async def start(self, ctx: Context, ev: StartEvent) -> ProcessEvent:
+    async def start(
+        self,
+        ctx: Context,
+        ev: StartEvent
+    ) -> ProcessEvent | StopEvent | None:
         """Creates the shared state store.
-        Gets a list of files in a directory.
+        Gets the list of files to check.
         Sends each file to a ProcessEvent.
         """
-        data_list = ConcurrentWorkflow.get_filenames('data/')
+        data_list = self.filenames
+        if data_list is None:
+            data_list = ConcurrentWorkflow.get_filenames(corpus.DATA_DIR)
+        if not data_list:
+            return StopEvent(
+                result=[["No Relevant Results"], ["No Non-Relevant Results"]]
+            )
         await ctx.store.set("num_to_collect", len(data_list))
         for item in data_list:
             print(f"Sending {item} to ProcessEvent")
@@ -67,21 +121,23 @@ class ConcurrentWorkflow(Workflow):
         print("--------------------------------")
         return None
 
-    @step(num_workers=5,
+    @step(num_workers=MAX_WORKERS,
           retry_policy=ConstantDelayRetryPolicy(delay=2, maximum_attempts=3)
           )
     async def process_data(self, ev: ProcessEvent) -> ResultEvent:
         """Defines multiple workers running asychronously.
         Each worker calls the rel_check function \
         on the file defined in its input ProcessEvent.
+        At most num_workers checks run at the same time.
         """
-        print(f"Starting relevancy check on {ev.filename}")
-        start = time.perf_counter()
-        # Asynchronously performs relevancy check operation
-        output = await rel_check(
-                prompt=self.prompt,
-                file_name=ev.filename)
-        end = time.perf_counter()
+        async with self.worker_limit:
+            print(f"Starting relevancy check on {ev.filename}")
+            start = time.perf_counter()
+            # Asynchronously performs relevancy check operation
+            output = await rel_check(
+                    prompt=self.prompt,
+                    file_name=ev.filename)
+            end = time.perf_counter()
         print(f"Finished relevancy check on {ev.filename} \
             in {end - start:.2f} seconds.")
         return ResultEvent(result=output)
@@ -118,3 +174,124 @@ class ConcurrentWorkflow(Workflow):
             non_rel_list.append("No Non-Relevant Results")
         results = [rel_list, non_rel_list]
         return StopEvent(result=results)
+
+
+class ShardedWorkflow(Workflow):
+    """Class to run a relevancy and retrieval sub-workflow \
+        for each shard of the corpus concurrently.
+    Each shard runs its own ConcurrentWorkflow with shard_workers workers.
+    retrieve is called with the relevant files of a shard and the prompt, \
+        and returns the chunks with their similarity scores.
+    The chunks of all shards are merged by score, keeping the top_k.
+    progress is an optional callback that receives each finished shard.
+    """
+    def __init__(
+        self,
+        prompt: str,
+        shards: dict[str, list[str]],
+        *args,
+        retrieve: Optional[
+            Callable[[list[str], str], list[NodeWithScore]]
+        ] = None,
+        shard_workers: int = 5,
+        top_k: int = 5,
+        progress: Optional[Callable[[str, dict], None]] = None,
+        **kwargs
+    ):
+        if not 1 <= shard_workers <= MAX_WORKERS:
+            raise ValueError(
+                f"shard_workers must be between 1 and {MAX_WORKERS}, "
+                f"got {shard_workers}."
+            )
+        self.prompt = prompt
+        self.shards = shards
+        self.retrieve = retrieve
+        self.shard_workers = shard_workers
+        self.top_k = top_k
+        self.progress = progress
+        super().__init__(*args, **kwargs)
+
+    @step
+    async def start(
+        self,
+        ctx: Context,
+        ev: StartEvent
+    ) -> ShardEvent | StopEvent | None:
+        """Sends each shard to a ShardEvent."""
+        if not self.shards:
+            return StopEvent(
+                result={"relevant": [], "non_relevant": [], "nodes": []}
+            )
+        await ctx.store.set("num_to_collect", len(self.shards))
+        for shard, filenames in self.shards.items():
+            print(f"Sending shard {shard} ({len(filenames)} files) "
+                  "to ShardEvent")
+            ctx.send_event(ShardEvent(shard=shard, filenames=filenames))
+        return None
+
+    @step(num_workers=MAX_CONCURRENT_SHARDS)
+    async def process_shard(self, ev: ShardEvent) -> ShardResultEvent:
+        """Runs the relevancy check on the files of one shard, \
+            then retrieves chunks from its relevant files.
+        """
+        start = time.perf_counter()
+        cwf = ConcurrentWorkflow(
+            prompt=self.prompt,
+            filenames=ev.filenames,
+            num_workers=self.shard_workers,
+            timeout=None
+        )
+        rel_list, non_rel_list = await cwf.run()
+        rel_list = [f for f in rel_list if f != "No Relevant Results"]
+        non_rel_list = [
+            f for f in non_rel_list if f != "No Non-Relevant Results"
+        ]
+        nodes = []
+        if rel_list and self.retrieve is not None:
+            # Run blocking retrieval in a thread
+            # so the other shards keep running.
+            nodes = await asyncio.to_thread(
+                self.retrieve, rel_list, self.prompt
+            )
+        end = time.perf_counter()
+        print(f"Finished shard {ev.shard} in {end - start:.2f} seconds.")
+        if self.progress is not None:
+            self.progress("shard_finished", {
+                "shard": ev.shard,
+                "relevant": len(rel_list),
+                "non_relevant": len(non_rel_list),
+                "seconds": round(end - start, 2),
+            })
+        return ShardResultEvent(
+            shard=ev.shard,
+            relevant=rel_list,
+            non_relevant=non_rel_list,
+            nodes=nodes
+        )
+
+    @step
+    async def combine_shards(
+        self,
+        ctx: Context,
+        ev: ShardResultEvent
+    ) -> StopEvent | None:
+        """Combines the results of all shards.
+        The chunks are merged by similarity score, highest first.
+        """
+        num_to_collect = await ctx.store.get("num_to_collect")
+        results = ctx.collect_events(ev, [ShardResultEvent] * num_to_collect)
+        if results is None:
+            return None
+        rel_list = []
+        non_rel_list = []
+        nodes = []
+        for event in results:
+            rel_list.extend(event.relevant)
+            non_rel_list.extend(event.non_relevant)
+            nodes.extend(event.nodes)
+        nodes.sort(key=lambda node: node.score or 0.0, reverse=True)
+        return StopEvent(result={
+            "relevant": rel_list,
+            "non_relevant": non_rel_list,
+            "nodes": nodes[:self.top_k],
+        })
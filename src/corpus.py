@@ -0,0 +1,135 @@
+import re
+from pathlib import Path
+
+
+"""Helpers that list the RAG corpus and partition it into shards.
+Each top-level subdirectory of a corpus root is one shard, \
+    e.g. data/georgia and data/montana.
+Shards are selected by the locations named in the prompt.
+"""
+
+# Default corpus, anchored on the project root so it does not depend
+# on the directory the app is started from
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# Shard that holds the files placed directly in a corpus root
+GENERAL_SHARD = "general"
+
+# State abbreviations, so "Atlanta, GA" selects the georgia shard
+US_STATES = {
+    "AL": "alabama", "AK": "alaska", "AZ": "arizona", "AR": "arkansas",
+    "CA": "california", "CO": "colorado", "CT": "connecticut",
+    "DE": "delaware", "DC": "district of columbia", "FL": "florida",
+    "GA": "georgia", "HI": "hawaii", "ID": "idaho", "IL": "illinois",
+    "IN": "indiana", "IA": "iowa", "KS": "kansas", "KY": "kentucky",
+    "LA": "louisiana", "ME": "maine", "MD": "maryland",
+    "MA": "massachusetts", "MI": "michigan", "MN": "minnesota",
+    "MS": "mississippi", "MO": "missouri", "MT": "montana",
+    "NE": "nebraska", "NV": "nevada", "NH": "new hampshire",
+    "NJ": "new jersey", "NM": "new mexico", "NY": "new york",
+    "NC": "north carolina", "ND": "north dakota", "OH": "ohio",
+    "OK": "oklahoma", "OR": "oregon", "PA": "pennsylvania",
+    "RI": "rhode island", "SC": "south carolina", "SD": "south dakota",
+    "TN": "tennessee", "TX": "texas", "UT": "utah", "VT": "vermont",
+    "VA": "virginia", "WA": "washington", "WV": "west virginia",
+    "WI": "wisconsin", "WY": "wyoming",
+}
+
+# A state abbreviation in location position: after a comma and at the end
+# of a clause, optionally followed by a ZIP code, e.g. "Atlanta, GA 30303."
+# Elsewhere two capitals are usually words, e.g. "IN", "OR", "OK", "LA".
+STATE_ABBREVIATION = re.compile(
+    r',\s*([A-Z])\.?([A-Z])\b\.?'
+    r'(?=\s*(?:\d{5}(?:-\d{4})?)?\s*(?:[,.;:!?)]|$))',
+    re.MULTILINE
+)
+
+# "Washington, DC" and "Washington D.C." name the district, not the state
+WASHINGTON_DC = re.compile(r'\bwashington,?\s*d\.?\s?c\b\.?', re.IGNORECASE)
+
+
+def get_filenames(directory_path) -> list[str]:
+    """Returns the files in a directory and its subdirectories.
+    Hidden files and directories are skipped.
+    """
+    path = Path(directory_path)
+    return sorted(
+        str(f) for f in path.rglob('*')
+        if f.is_file() and not any(
+            part.startswith('.') for part in f.relative_to(path).parts
+        )
+    )
+
+
+def get_shards(corpus_roots: list[str]) -> dict[str, list[str]]:
+    """Partitions the corpus roots into shards, one per top-level directory.
+    Shards with the same name in different roots are merged.
+    Files directly in a root go into the general shard.
+    """
+    shards = {}
+    for root in corpus_roots:
+        root_path = Path(root)
+        if not root_path.is_dir():
+            print(f"Skipping missing corpus root {root}")
+            continue
+        for path in sorted(root_path.iterdir()):
+            if path.name.startswith('.'):
+                continue
+            if path.is_dir():
+                files = get_filenames(path)
+                if files:
+                    shards.setdefault(path.name, []).extend(files)
+            elif path.is_file():
+                shards.setdefault(GENERAL_SHARD, []).append(str(path))
+    return shards
+
+
+def shard_location(name: str) -> str:
+    """Returns the location a shard name stands for, in lower case.
+    new_york becomes "new york", and a state abbreviation like ga \
+        becomes "georgia".
+    """
+    words = re.sub(r'[_\-\s]+', ' ', name).strip().lower()
+    return US_STATES.get(words.upper(), words)
+
+
+def select_shards(
+    shards: dict[str, list[str]],
+    prompt: str,
+    fallback_to_all: bool = False
+) -> dict[str, list[str]]:
+    """Returns the shards whose location is named in the prompt.
+    State abbreviations count as names in location position only \
+        (e.g. "Atlanta, GA"), so "in LA" or "IN Atlanta" select nothing.
+    "Washington, DC" selects the district of columbia shard only.
+    Longer names are matched first and consume their words, \
+        so "West Virginia" does not also select the virginia shard.
+    The general shard is always kept.
+    If the prompt names no shard, only the general shard is returned, \
+        or every shard when fallback_to_all is True.
+    """
+    def expand(match: re.Match) -> str:
+        state = US_STATES.get(match[1] + match[2])
+        return match[0] if state is None else f", {state}"
+
+    text = WASHINGTON_DC.sub(f" {US_STATES['DC']} ", prompt)
+    text = STATE_ABBREVIATION.sub(expand, text).lower()
+
+    locations = {}
+    for name in shards:
+        if name != GENERAL_SHARD:
+            locations.setdefault(shard_location(name), []).append(name)
+
+    selected = {}
+    for location in sorted(locations, key=len, reverse=True):
+        pattern = rf'\b{re.escape(location)}\b'
+        if re.search(pattern, text):
+            for name in locations[location]:
+                selected[name] = shards[name]
+            text = re.sub(pattern, ' ', text)
+
+    if not selected and fallback_to_all:
+        return dict(shards)
+    if GENERAL_SHARD in shards:
+        selected[GENERAL_SHARD] = shards[GENERAL_SHARD]
+    return selected
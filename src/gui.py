@@ -2,8 +2,10 @@ import asyncio
 from pathlib import Path
 from typing import Optional
 import time
-from nicegui import app, ui
+from nicegui import app, background_tasks, ui
+import api
 import report
+import warmup
 
 # Theme from permit_pal_banner.png: dark base, \
 # teal/rose/lavender accents, white text
@@ -125,7 +127,7 @@ def create_page() -> None:
       * Banner image (permit_pal_banner.png)
       * Prompt input textarea (first argument to create_report)
       * LLM model dropdown sourced from report.LLM_MODEL
-      * RAG enable/disable toggle (controls report.RAG_ENABLED)
+      * RAG enable/disable toggle (passed to create_report as rag_enabled)
       * Generate button to trigger report creation
       * Markdown area to display the generated report table
       * Error display area for validation and runtime errors
@@ -205,11 +207,15 @@ def create_page() -> None:
             await asyncio.sleep(0)
 
             try:
-                report.RAG_ENABLED = bool(rag_toggle.value)
                 print("\n--------------------------------")
                 print("Starting report generation from the UI.")
                 start = time.perf_counter()
-                output_table = await report.create_report(prompt, model)
+                # Passed per call so API jobs in this process are unaffected
+                output_table = await report.create_report(
+                    prompt,
+                    model,
+                    rag_enabled=bool(rag_toggle.value)
+                )
                 end = time.perf_counter()
                 print(f"Report generation time from the UI: "
                       f"{end - start:.2f} seconds.\n")
@@ -233,10 +239,16 @@ def create_page() -> None:
 
 
 def main() -> None:
-    """Run the NiceGUI web application."""
+    """Run the NiceGUI web application.
+    The headless JSON/SSE API from api.py is served alongside the page.
+    The Ollama models in warmup.WARMUP_MODELS are preloaded at startup.
+    """
     assets_dir = Path(__file__).resolve().parent.parent / "assets"
     if assets_dir.is_dir():
         app.add_static_files("/assets", str(assets_dir))
+    app.include_router(api.router)
+    # Warm up in the background so the page is served while models load
+    app.on_startup(lambda: background_tasks.create(warmup.warm_up()))
     create_page()
     ui.run(title="Permit Pal", reload=False)
 
@@ -1,5 +1,9 @@
 import asyncio
+import rag_utils
 import report
+import routing
+import warmup
+from conc_workflow import MAX_WORKERS
 import argparse
 import time
 
@@ -11,24 +15,72 @@ Output is printed to the console.
 Example usage:
 python src/permit_pal.py --prompt "I want to open a restaurant in Atlanta, Georgia" --llm_model "gemini-2.5-pro" --rag  # noqa: E501
 python src/permit_pal.py --prompt "I want to open a restaurant in Atlanta, Georgia" --llm_model "gemini-2.5-pro"  # noqa: E501
+python src/permit_pal.py --prompt "I want to open a restaurant in Atlanta, Georgia" --llm_model "gemini-2.5-pro" --routing fallback --backup_model "phi4-mini"  # noqa: E501
+python src/permit_pal.py --prompt "I want to open a restaurant in Atlanta, Georgia" --llm_model "phi4-mini" --rag --keep_alive 1h --embed_batch_size 64  # noqa: E501
+python src/permit_pal.py --prompt "I want to open a restaurant in Atlanta, Georgia" --llm_model "gemini-2.5-pro" --rag --corpus_roots data/ /mnt/permits/  # noqa: E501
 """
 
 
 async def main():
     """Main function for running the application logic in a CLI.
-    Takes the prompt, LLM model name, \
-        and RAG enabled flag as arguments from the command line.
+    Takes the prompt, LLM model name, RAG enabled flag, \
+        routing policy, RAG corpus, and Ollama tuning \
+        as arguments from the command line.
+    The Ollama models used by this run are warmed up in the background \
+        while the report starts, e.g. during the Gemini relevancy checks.
     """
     parser = argparse.ArgumentParser()
     parser.add_argument('--prompt', type=str, required=True)
     parser.add_argument('--llm_model', type=str, required=True)
     parser.add_argument('--rag', action='store_true')
+    parser.add_argument('--routing', type=str, default='single',
+                        choices=routing.ROUTING_MODES)
+    parser.add_argument('--backup_model', type=str, default=None)
+    parser.add_argument('--keep_alive', type=rag_utils.parse_keep_alive,
+                        default=rag_utils.KEEP_ALIVE)
+    parser.add_argument('--embed_batch_size', type=int,
+                        default=rag_utils.EMBED_BATCH_SIZE)
+    parser.add_argument('--no_warmup', action='store_true')
+    parser.add_argument('--corpus_roots', type=str, nargs='+',
+                        default=rag_utils.CORPUS_ROOTS)
+    parser.add_argument('--shard_workers', type=int,
+                        default=rag_utils.SHARD_NUM_WORKERS)
+    parser.add_argument('--shard_fallback_all', action='store_true',
+                        default=rag_utils.SHARD_FALLBACK_ALL)
     args = parser.parse_args()
+    if not 1 <= args.shard_workers <= MAX_WORKERS:
+        parser.error(
+            f"--shard_workers must be between 1 and {MAX_WORKERS}"
+        )
     report.RAG_ENABLED = args.rag
+    report.ROUTING_POLICY = routing.RoutingPolicy(
+        mode=args.routing,
+        backup_model=args.backup_model
+    )
+    rag_utils.KEEP_ALIVE = args.keep_alive
+    rag_utils.EMBED_BATCH_SIZE = args.embed_batch_size
+    rag_utils.CORPUS_ROOTS = args.corpus_roots
+    rag_utils.SHARD_NUM_WORKERS = args.shard_workers
+    rag_utils.SHARD_FALLBACK_ALL = args.shard_fallback_all
+    models = [args.llm_model]
+    if args.routing != 'single':
+        models.append(
+            args.backup_model or report.backup_model_for(args.llm_model)
+        )
+    if args.rag:
+        models += [rag_utils.RAG_MODEL, rag_utils.EMBED_MODEL]
     start = time.perf_counter()
+    warmup_task = None
+    if not args.no_warmup:
+        warmup_task = asyncio.create_task(warmup.warm_up(models))
     output_table = await report.create_report(args.prompt, args.llm_model)
     end = time.perf_counter()
+    if warmup_task is not None:
+        await warmup_task
     print(f"Total execution time: {end - start:.2f} seconds.")
+    print("Model latency metrics:")
+    for model, metrics in routing.LATENCY.snapshot().items():
+        print(f"{model}: {metrics}")
     print("Final Report Output:\n" + output_table)
 
 if __name__ == "__main__":
@@ -1,103 +1,225 @@
 import asyncio
+import os
 import time
-from conc_workflow import ConcurrentWorkflow
+from typing import Callable, Optional, Union
+import routing
+import corpus
+from conc_workflow import ShardedWorkflow
 from llama_index.core import (
     SimpleDirectoryReader,
     VectorStoreIndex,
     get_response_synthesizer
 )
 from llama_index.core.retrievers import VectorIndexRetriever
-from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import NodeWithScore
 from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.llms.ollama import Ollama
 
+OLLAMA_BASE_URL = "http://localhost:11434"
 
-def get_context(filenames: [str], prompt: str, llm) -> str:
+# Models used by the RAG pipeline
+RAG_MODEL = "phi4-mini"
+EMBED_MODEL = "embeddinggemma"
+
+
+def parse_keep_alive(value: str) -> Union[int, float, str]:
+    """Converts a plain number of seconds (e.g. "-1" or "300") to a number.
+    Ollama rejects numeric strings without a unit, \
+        but accepts numbers, where -1 keeps the model loaded forever.
+    Durations with a unit (e.g. "30m") are returned unchanged.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# How long the Ollama server keeps a model loaded after its last request
+KEEP_ALIVE = parse_keep_alive(os.getenv("PERMIT_PAL_KEEP_ALIVE", "30m"))
+
+# Chunks sent per embedding request, and embedding requests run at once
+EMBED_BATCH_SIZE = int(os.getenv("PERMIT_PAL_EMBED_BATCH_SIZE", "32"))
+EMBED_NUM_WORKERS = int(os.getenv("PERMIT_PAL_EMBED_NUM_WORKERS", "4"))
+
+# Directories searched recursively for RAG documents, comma separated.
+# Each top-level subdirectory (e.g. data/georgia) is one shard.
+# Relative roots are resolved from the directory the app is started in.
+CORPUS_ROOTS = [
+    root.strip() for root in os.getenv(
+        "PERMIT_PAL_CORPUS_ROOTS",
+        str(corpus.DATA_DIR)
+    ).split(",") if root.strip()
+]
+
+# Search every shard when the prompt names none, instead of only general
+SHARD_FALLBACK_ALL = os.getenv(
+    "PERMIT_PAL_SHARD_FALLBACK_ALL", "false"
+).lower() in ("1", "true", "yes")
+
+# Relevancy checks running at once in each shard
+SHARD_NUM_WORKERS = int(os.getenv("PERMIT_PAL_SHARD_WORKERS", "5"))
+
+# Chunks kept after merging the shards by similarity score
+TOP_K = 5
+
+
+def get_nodes(filenames: [str], prompt: str) -> list[NodeWithScore]:
     """Takes a list of files, and embeds them into a vectorstore.
-    An LLM synthesizes a response \
-        from the chunks with top similarity to the prompt.
+    Returns the chunks with top similarity to the prompt, with their scores.
     """
     documents = SimpleDirectoryReader(input_files=filenames).load_data()
     print("Starting document embedding into VectorStoreIndex.")
     start = time.perf_counter()
     ollama_embedding = OllamaEmbedding(
-        model_name="embeddinggemma",
-        base_url="http://localhost:11434"
+        model_name=EMBED_MODEL,
+        base_url=OLLAMA_BASE_URL,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        num_workers=EMBED_NUM_WORKERS,
+        keep_alive=KEEP_ALIVE
     )
+    # use_async sends the embedding batches concurrently,
+    # up to EMBED_NUM_WORKERS requests at a time
     index = VectorStoreIndex.from_documents(
         documents=documents,
-        embed_model=ollama_embedding
+        embed_model=ollama_embedding,
+        use_async=True
     )
     end = time.perf_counter()
+    # Not recorded in routing.LATENCY: the time covers every batch
+    # and the index build, so it is not one embedding call
     print(f"Embed Into VectorStoreIndex Execution Time :  \
         {end - start:.2f} seconds.")
     print("--------------------------------")
-    # Returning 5 chunks that have highest similarity score to the prompt
+    # Returning TOP_K chunks that have highest similarity score to the prompt
     # Keeping this number small to lower runtime for the demo
     retriever = VectorIndexRetriever(
         index=index,
-        similarity_top_k=5,
+        similarity_top_k=TOP_K,
     )
+    return retriever.retrieve(prompt)
+
+
+def get_context(nodes: list[NodeWithScore], prompt: str, llm) -> str:
+    """An LLM synthesizes a response from the given chunks.
+    The synthesis time is recorded under "rag:<model>", \
+        apart from the model's report calls that drive routing.
+    """
+    # Consider changing this to CitationQueryEngine in the future
+    # In order to tie chunks back to source document
     response_synthesizer = get_response_synthesizer(
         response_mode="refine",
         llm=llm
     )
-    # Consider changing this to CitationQueryEngine in the future
-    # In order to tie chunks back to source document
-    query_engine = RetrieverQueryEngine(
-        retriever=retriever,
-        response_synthesizer=response_synthesizer,
-    )
-    print("Starting RetrieverQueryEngine execution.")
+    print("Starting response synthesis.")
     start = time.perf_counter()
-    response = query_engine.query(prompt)
+    response = response_synthesizer.synthesize(prompt, nodes=nodes)
     end = time.perf_counter()
-    print(f"RetrieverQueryEngine execution Time :  \
+    routing.LATENCY.record(f"rag:{llm.model}", end - start)
+    print(f"Response synthesis execution Time :  \
         {end - start:.2f} seconds.")
     print("--------------------------------")
     return str(response)
 
 
-async def add_context(prompt: str) -> str:
-    """Runs the ConcurrentWorkflow to get a list of relevant files.
-    Passes the files into get_context \
-        to output the generated additional context from the files.
+def notify(
+    progress: Optional[Callable[[str, dict], None]],
+    stage: str,
+    **data
+) -> None:
+    """Reports a workflow stage to the progress callback, if one was given.
+    Used by the API to stream progress events for each stage.
     """
-    cwf = ConcurrentWorkflow(
+    if progress is not None:
+        progress(stage, data)
+
+
+async def run_shards(
+    prompt: str,
+    retrieve: Optional[Callable[[list[str], str], list]] = None,
+    progress: Optional[Callable[[str, dict], None]] = None
+) -> dict:
+    """Partitions CORPUS_ROOTS into shards and keeps the ones \
+        named in the prompt.
+    Runs the ShardedWorkflow to check relevancy in each shard concurrently, \
+        and to retrieve chunks from the relevant files if retrieve is given.
+    Returns the relevant files, non-relevant files, and merged chunks.
+    """
+    shards = corpus.select_shards(
+        corpus.get_shards(CORPUS_ROOTS),
+        prompt,
+        fallback_to_all=SHARD_FALLBACK_ALL
+    )
+    swf = ShardedWorkflow(
             prompt=prompt,
+            shards=shards,
+            retrieve=retrieve,
+            shard_workers=SHARD_NUM_WORKERS,
+            top_k=TOP_K,
+            progress=progress,
             timeout=None
         )
     print("--------------------------------")
-    print("Starting execution of ConcurrentWorkflow.")
+    print(f"Starting execution of ShardedWorkflow on shards: "
+          f"{', '.join(shards) or 'none'}.")
     print("--------------------------------")
+    notify(progress, "relevancy_started", shards=list(shards))
     start = time.perf_counter()
-    result = await cwf.run()
+    result = await swf.run()
     end = time.perf_counter()
+    notify(
+        progress,
+        "relevancy_finished",
+        relevant=result["relevant"],
+        non_relevant=result["non_relevant"],
+        seconds=round(end - start, 2)
+    )
     print("--------------------------------")
-    print(f"Elapsed runtime of ConcurrentWorkflow = \
+    print(f"Elapsed runtime of ShardedWorkflow = \
         {end - start:.2f} seconds.")
     print("--------------------------------")
-    print("\nResult of ConcurrentWorkflow\n")
+    print("\nResult of ShardedWorkflow\n")
     print("List of relevant files:")
     print("--------------------------------")
-    for file in result[0]:
+    for file in result["relevant"] or ["No Relevant Results"]:
         print(file)
     print("--------------------------------\n")
     print("List of non-relevant files:")
     print("--------------------------------")
-    for file in result[1]:
+    for file in result["non_relevant"] or ["No Non-Relevant Results"]:
         print(file)
     print("--------------------------------\n")
+    return result
+
+
+async def add_context(
+    prompt: str,
+    progress: Optional[Callable[[str, dict], None]] = None
+) -> str:
+    """Runs the ShardedWorkflow to get the chunks from relevant files, \
+        merged by score across the shards.
+    Passes the chunks into get_context \
+        to output the generated additional context from the files.
+    progress is an optional callback that receives each workflow stage.
+    """
+    result = await run_shards(prompt, retrieve=get_nodes, progress=progress)
 
-    if result[0][0] != "No Relevant Results":
+    if result["nodes"]:
         # Run blocking get_context in a thread
         # so the event loop stays responsive.
+        notify(progress, "synthesis_started", chunks=len(result["nodes"]))
+        start = time.perf_counter()
         additional_context = await asyncio.to_thread(
             get_context,
-            result[0],
+            result["nodes"],
             prompt,
             get_ollama_llm(),
         )
+        end = time.perf_counter()
+        notify(progress, "synthesis_finished", seconds=round(end - start, 2))
     else:
         additional_context = " "
     print("RAG loop results:")
@@ -107,7 +229,7 @@ async def add_context(prompt: str) -> str:
     return additional_context
 
 
-def get_ollama_llm(model='phi4-mini'):
+def get_ollama_llm(model=RAG_MODEL):
     """Helper function that returns an LLM model.
     Called in add_context.
     Passed into get_context. used in get_response_synthesizer.
@@ -117,6 +239,7 @@ def get_ollama_llm(model='phi4-mini'):
         temperature=0.1,
         max_tokens=200,
         context_window=8000,
-        request_timeout=600
+        request_timeout=600,
+        keep_alive=KEEP_ALIVE
     )
     return ollama_llm
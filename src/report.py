@@ -1,6 +1,7 @@
-import asyncio
 import time
+from typing import Callable, Optional
 import rag_utils
+import routing
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from llama_index.core.llms import ChatMessage
@@ -27,6 +28,12 @@ LLM_MODEL = [
 # Control whether the RAG loop is used
 RAG_ENABLED = False
 
+# Control how a backup model is used when the selected model is slow
+ROUTING_POLICY = routing.RoutingPolicy()
+
+# Backup for Ollama models when the routing policy does not name one
+GEMINI_BACKUP_MODEL = 'gemini-2.5-flash'
+
 SYSTEM_PROMPT = """
 You are an expert in government rules, codes, and regulations.
 As input, you will receive an action that a person wants to accomplish and a location where that action will be performed.
@@ -68,16 +75,16 @@ CONTEXT:
 """  # noqa: E501
 
 
-async def gemini_report(input_prompt: str, gemini_model: str) -> str:
+async def gemini_report(
+    input_prompt: str,
+    gemini_model: str,
+    additional_context: str = " ",
+    progress: Optional[Callable[[str, dict], None]] = None
+) -> str:
     """Sends the input prompt to a Google Gemini LLM model.
-    If RAG is enabled, calls add_context from rag_utils to \
-        get additional info from the RAG corpus.
+    additional_context is the RAG context added to the system prompt.
     Returns a string that contains the generated report formatted in Markdown.
     """
-    additional_context = " "
-    if RAG_ENABLED:
-        additional_context = await rag_utils.add_context(input_prompt)
-
     gemini_ai_model = ChatGoogleGenerativeAI(
         model=gemini_model,
         temperature=0.0,  # Gemini 3.0+ defaults to 1.0
@@ -91,11 +98,19 @@ async def gemini_report(input_prompt: str, gemini_model: str) -> str:
     ]
     print(f"Starting main {gemini_model} model execution.")
     print("--------------------------------")
+    rag_utils.notify(progress, "generation_started", model=gemini_model)
     start = time.perf_counter()
-    # Run blocking invoke in a thread so the event loop stays responsive
-    # (keeps NiceGUI WebSocket alive during long LLM calls).
-    ai_msg = await asyncio.to_thread(gemini_ai_model.invoke, messages)
+    # Use the async client so the event loop stays responsive
+    # (keeps NiceGUI WebSocket alive during long LLM calls),
+    # and so a hedged or timed-out call is cancelled at the HTTP request.
+    ai_msg = await gemini_ai_model.ainvoke(messages)
     end = time.perf_counter()
+    rag_utils.notify(
+        progress,
+        "generation_finished",
+        model=gemini_model,
+        seconds=round(end - start, 2)
+    )
     print("--------------------------------")
     print("--------------------------------")
     print(f"Main {gemini_model} model execution time : \
@@ -109,22 +124,23 @@ async def gemini_report(input_prompt: str, gemini_model: str) -> str:
     return output_table
 
 
-async def ollama_report(input_prompt: str, ollama_model: str) -> str:
+async def ollama_report(
+    input_prompt: str,
+    ollama_model: str,
+    additional_context: str = " ",
+    progress: Optional[Callable[[str, dict], None]] = None
+) -> str:
     """Sends the input prompt to a local LLM model.
-    If RAG is enabled, calls add_context from rag_utils to \
-        get additional info from the RAG corpus.
+    additional_context is the RAG context added to the system prompt.
     Returns a string that contains the generated report formatted in Markdown.
     """
-    additional_context = " "
-    if RAG_ENABLED:
-        additional_context = await rag_utils.add_context(input_prompt)
-
     ollama_model = Ollama(
         model=ollama_model,
         temperature=0.1,
         max_tokens=500,
         context_window=8000,
-        request_timeout=600
+        request_timeout=600,
+        keep_alive=rag_utils.KEEP_ALIVE
     )
     messages = [
         ChatMessage(
@@ -134,14 +150,19 @@ async def ollama_report(input_prompt: str, ollama_model: str) -> str:
         ChatMessage(role="user", content=input_prompt)
     ]
     print(f"Starting main {ollama_model} model execution.")
+    rag_utils.notify(progress, "generation_started", model=ollama_model.model)
     start = time.perf_counter()
-    # Run blocking invoke in a thread so the event loop stays responsive
-    # (keeps NiceGUI WebSocket alive during long LLM calls).
-    ai_msg = await asyncio.to_thread(
-        ollama_model.chat,
-        messages=messages
-    )
+    # Use the async client so the event loop stays responsive
+    # (keeps NiceGUI WebSocket alive during long LLM calls),
+    # and so a hedged or timed-out call is cancelled at the HTTP request.
+    ai_msg = await ollama_model.achat(messages=messages)
     end = time.perf_counter()
+    rag_utils.notify(
+        progress,
+        "generation_finished",
+        model=ollama_model.model,
+        seconds=round(end - start, 2)
+    )
     print("--------------------------------")
     print("--------------------------------")
     print(f"Main {ollama_model} model execution time : \
@@ -152,14 +173,71 @@ async def ollama_report(input_prompt: str, ollama_model: str) -> str:
     return output_table
 
 
-async def create_report(input_prompt: str, model_name: str) -> str:
-    """Wrapper for functions that generate the report.
-    Different functions are called to use different LLMs \
-        based on the model that is being used.
+def backup_model_for(model_name: str) -> str:
+    """Returns a model on the other backend to back up model_name.
+    Ollama models are backed up by GEMINI_BACKUP_MODEL, \
+        a flash model that answers faster than the pro models.
+    Gemini models are backed up by the first Ollama model in LLM_MODEL.
+    Used when the routing policy does not name a backup model.
     """
-    output = ""
+    is_gemini = model_name.startswith('gemini')
+    if not is_gemini:
+        return GEMINI_BACKUP_MODEL
+    for model in LLM_MODEL:
+        if model.startswith('gemini') != is_gemini:
+            return model
+    return model_name
+
+
+async def model_report(
+    input_prompt: str,
+    model_name: str,
+    additional_context: str = " ",
+    progress: Optional[Callable[[str, dict], None]] = None
+) -> str:
+    """Calls the report function for the backend that serves model_name."""
     if model_name.startswith('gemini'):
-        output = await gemini_report(input_prompt, model_name)
-    else:
-        output = await ollama_report(input_prompt, model_name)
-    return output
+        return await gemini_report(
+            input_prompt, model_name, additional_context, progress
+        )
+    return await ollama_report(
+        input_prompt, model_name, additional_context, progress
+    )
+
+
+async def create_report(
+    input_prompt: str,
+    model_name: str,
+    rag_enabled: Optional[bool] = None,
+    progress: Optional[Callable[[str, dict], None]] = None,
+    policy: Optional[routing.RoutingPolicy] = None
+) -> str:
+    """Wrapper for functions that generate the report.
+    If RAG is enabled, calls add_context from rag_utils once to \
+        get additional info from the RAG corpus.
+    The routing policy decides whether a backup model is hedged or \
+        used as a fallback; the backend is picked from each model name.
+    rag_enabled and policy override RAG_ENABLED and ROUTING_POLICY \
+        for this call when they are not None, \
+        so concurrent API requests do not share the module settings.
+    progress is an optional callback that receives each workflow stage.
+    """
+    if rag_enabled is None:
+        rag_enabled = RAG_ENABLED
+    if policy is None:
+        policy = ROUTING_POLICY
+    additional_context = " "
+    if rag_enabled:
+        additional_context = await rag_utils.add_context(
+            input_prompt,
+            progress=progress
+        )
+
+    async def call(model: str) -> str:
+        return await model_report(
+            input_prompt, model, additional_context, progress
+        )
+    backup_model = policy.backup_model
+    if backup_model is None and policy.mode != "single":
+        backup_model = backup_model_for(model_name)
+    return await routing.route(model_name, backup_model, call, policy)
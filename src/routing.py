@@ -0,0 +1,291 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+
+"""Routing policies that decide which LLM backend generates a report.
+A per-model latency tracker records how long each model takes, \
+    and its p95 drives the hedge delay and the fallback deadline.
+"""
+
+# Number of recent calls kept per model
+LATENCY_WINDOW = 50
+
+# Calls needed before a model's p95 is trusted over the policy defaults
+MIN_SAMPLES = 5
+
+ROUTING_MODES = ("single", "hedged", "fallback")
+
+
+class LatencyTracker:
+    """Keeps a rolling window of successful call latencies per model.
+    Failed, timed out, and invalid calls are counted separately.
+    The first call and the startup warm-up of each model are kept \
+        apart, so the cold-model penalty is visible in the metrics.
+    Calls are recorded from RAG threads too, so updates hold a lock.
+    """
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque[float]] = {}
+        self._failures: dict[str, int] = {}
+        self._first_calls: dict[str, float] = {}
+        self._warmups: dict[str, float] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            if model not in self._latencies:
+                self._latencies[model] = deque(maxlen=self.window)
+                self._first_calls[model] = seconds
+            self._latencies[model].append(seconds)
+
+    def record_warmup(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._warmups[model] = seconds
+
+    def record_failure(self, model: str) -> None:
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        """Returns the nearest-rank percentile of the model's latencies.
+        Returns None until the model has MIN_SAMPLES recorded calls.
+        """
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        rank = max(1, round(pct / 100 * len(samples)))
+        return samples[rank - 1]
+
+    def p95(self, model: str) -> Optional[float]:
+        return self.percentile(model, 95)
+
+    def first_call_penalty(self, model: str) -> Optional[float]:
+        """Returns how much slower the first call was than steady state.
+        Steady state is the median once there are MIN_SAMPLES calls, \
+            and the latest call before that.
+        Returns None until the model has a second call to compare with.
+        """
+        with self._lock:
+            first_call = self._first_calls.get(model)
+            samples = list(self._latencies.get(model, ()))
+        if len(samples) < 2:
+            return None
+        steady = self.percentile(model, 50)
+        if steady is None:
+            steady = samples[-1]
+        return first_call - steady
+
+    def snapshot(self) -> dict[str, dict]:
+        """Returns per-model call counts, latency percentiles, \
+            warm-up time, and first-call penalty.
+        """
+        with self._lock:
+            models = set(self._latencies) | set(self._failures) \
+                | set(self._warmups)
+        snapshot = {}
+        for model in sorted(models):
+            with self._lock:
+                calls = len(self._latencies.get(model, ()))
+                failures = self._failures.get(model, 0)
+                first_call = self._first_calls.get(model)
+                warmup = self._warmups.get(model)
+            snapshot[model] = {
+                "calls": calls,
+                "failures": failures,
+                "p50": self.percentile(model, 50),
+                "p95": self.p95(model),
+                "first_call": first_call,
+                "first_call_penalty": self.first_call_penalty(model),
+                "warmup": warmup,
+            }
+        return snapshot
+
+
+# Shared by every report generated in this process
+LATENCY = LatencyTracker()
+
+
+@dataclass
+class RoutingPolicy:
+    """Controls how create_report uses a backup model.
+    mode "single" only calls the primary model.
+    mode "hedged" fires the backup model once the primary has run \
+        longer than its p95 (hedge_delay until there is enough data), \
+        then keeps the first valid table and cancels the other call.
+    mode "fallback" gives the primary model a deadline \
+        (its p95 times deadline_factor, capped at deadline) \
+        and calls the backup model if it is missed or fails.
+    backup_model defaults to a model on the other backend when None.
+    """
+    mode: str = "single"
+    backup_model: Optional[str] = None
+    hedge_delay: float = 30.0
+    deadline: float = 180.0
+    deadline_factor: float = 2.0
+
+    def __post_init__(self):
+        if self.mode not in ROUTING_MODES:
+            raise ValueError(
+                f"Unknown routing mode {self.mode!r}, "
+                f"expected one of {ROUTING_MODES}."
+            )
+
+
+def is_valid_table(output: str) -> bool:
+    """Returns True if the output contains a Markdown table \
+        with a header separator row.
+    """
+    if not output:
+        return False
+    return any(
+        "|" in line and "---" in line for line in output.splitlines()
+    )
+
+
+def hedge_delay(primary: str, policy: RoutingPolicy) -> float:
+    """Returns how long the primary runs before the backup is fired: \
+        its p95, or policy.hedge_delay until there is enough data.
+    """
+    p95 = LATENCY.p95(primary)
+    return policy.hedge_delay if p95 is None else p95
+
+
+def fallback_deadline(primary: str, policy: RoutingPolicy) -> float:
+    """Returns the primary's p95 times policy.deadline_factor, \
+        capped at policy.deadline.
+    """
+    p95 = LATENCY.p95(primary)
+    if p95 is None:
+        return policy.deadline
+    return min(policy.deadline, p95 * policy.deadline_factor)
+
+
+async def timed_call(
+    model: str,
+    call: Callable[[str], Awaitable[str]]
+) -> str:
+    """Calls the model and records its latency in LATENCY.
+    Calls that raise or return no valid table count as failures.
+    Cancelled calls record nothing; hedged_call and fallback_call \
+        record the primary's lower bound themselves.
+    """
+    start = time.perf_counter()
+    try:
+        output = await call(model)
+    except Exception:
+        LATENCY.record_failure(model)
+        raise
+    end = time.perf_counter()
+    if is_valid_table(output):
+        LATENCY.record(model, end - start)
+    else:
+        LATENCY.record_failure(model)
+    return output
+
+
+async def hedged_call(
+    primary: str,
+    backup: str,
+    call: Callable[[str], Awaitable[str]],
+    policy: RoutingPolicy
+) -> str:
+    """Fires the backup model if the primary is slower than its p95 \
+        or finishes without a valid table.
+    Returns the first valid table and cancels the call still running.
+    A primary cancelled by a faster backup ran at least as long \
+        as the hedge, so that time is recorded as its sample; \
+        otherwise slow calls would never reach the p95.
+    A cancelled backup records nothing.
+    """
+    delay = hedge_delay(primary, policy)
+    start = time.perf_counter()
+    primary_task = asyncio.create_task(timed_call(primary, call))
+    pending = {primary_task}
+    backup_task = None
+    first_output = None
+    last_error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=delay if backup_task is None else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    output = task.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if is_valid_table(output):
+                    return output
+                if first_output is None:
+                    first_output = output
+            if backup_task is None:
+                print(f"Hedging {primary} with {backup} "
+                      f"after {delay:.2f} seconds.")
+                backup_task = asyncio.create_task(timed_call(backup, call))
+                pending.add(backup_task)
+    finally:
+        # Cancelling closes the losing model's HTTP request
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if primary_task in pending:
+            LATENCY.record(primary, time.perf_counter() - start)
+    if first_output is not None:
+        return first_output
+    raise last_error
+
+
+async def fallback_call(
+    primary: str,
+    backup: str,
+    call: Callable[[str], Awaitable[str]],
+    policy: RoutingPolicy
+) -> str:
+    """Calls the primary model with a deadline derived from its p95.
+    Calls the backup model if the deadline is missed, \
+        the primary fails, or it returns no valid table.
+    A missed deadline counts as a failure, and the deadline \
+        is recorded as the primary's lower-bound sample.
+    """
+    deadline = fallback_deadline(primary, policy)
+    try:
+        output = await asyncio.wait_for(
+            timed_call(primary, call),
+            timeout=deadline
+        )
+        if is_valid_table(output):
+            return output
+        reason = "returned no valid table"
+    except asyncio.TimeoutError:
+        LATENCY.record(primary, deadline)
+        LATENCY.record_failure(primary)
+        reason = f"missed the {deadline:.2f} second deadline"
+    except Exception as e:
+        reason = f"failed with {e!r}"
+    print(f"{primary} {reason}, falling back to {backup}.")
+    return await timed_call(backup, call)
+
+
+async def route(
+    primary: str,
+    backup: Optional[str],
+    call: Callable[[str], Awaitable[str]],
+    policy: RoutingPolicy
+) -> str:
+    """Runs call(model) for the primary and backup models \
+        as the routing policy describes.
+    """
+    if backup is not None and backup != primary:
+        if policy.mode == "hedged":
+            return await hedged_call(primary, backup, call, policy)
+        if policy.mode == "fallback":
+            return await fallback_call(primary, backup, call, policy)
+    return await timed_call(primary, call)
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+from ollama import AsyncClient
+import rag_utils
+import report
+import routing
+
+
+"""Preloads Ollama models at startup so the first request \
+    does not pay the model-load time.
+The models stay loaded for rag_utils.KEEP_ALIVE after their last request.
+Warm-up times are recorded in routing.LATENCY next to the first-call times.
+"""
+
+# Models preloaded at startup, comma separated in PERMIT_PAL_WARMUP_MODELS.
+# Defaults to every Ollama report model plus the RAG models, which needs
+# memory for all of them at once; narrow it on smaller machines.
+WARMUP_MODELS = [
+    model.strip() for model in os.getenv(
+        "PERMIT_PAL_WARMUP_MODELS",
+        ",".join(
+            [m for m in report.LLM_MODEL if not m.startswith('gemini')]
+            + [rag_utils.RAG_MODEL, rag_utils.EMBED_MODEL]
+        )
+    ).split(",") if model.strip()
+]
+
+
+async def warm_up_model(client: AsyncClient, model: str) -> None:
+    """Loads one model into the Ollama server and records the load time.
+    Embedding models cannot generate, so they are sent a short embedding.
+    """
+    start = time.perf_counter()
+    if model == rag_utils.EMBED_MODEL:
+        await client.embed(
+            model=model,
+            input="warm up",
+            keep_alive=rag_utils.KEEP_ALIVE
+        )
+    else:
+        # An empty prompt only loads the model
+        await client.generate(
+            model=model,
+            prompt="",
+            keep_alive=rag_utils.KEEP_ALIVE
+        )
+    end = time.perf_counter()
+    routing.LATENCY.record_warmup(model, end - start)
+    print(f"Warm-up of {model} took {end - start:.2f} seconds.")
+
+
+async def warm_up(models: list[str] = None) -> None:
+    """Preloads the given models (WARMUP_MODELS by default) concurrently.
+    Gemini models are skipped, and a model that fails to load \
+        is reported without stopping the others.
+    """
+    if models is None:
+        models = WARMUP_MODELS
+    models = [m for m in dict.fromkeys(models) if not m.startswith('gemini')]
+    if not models:
+        return
+    client = AsyncClient(host=rag_utils.OLLAMA_BASE_URL)
+    print(f"Warming up {', '.join(models)} "
+          f"with keep-alive {rag_utils.KEEP_ALIVE}.")
+    results = await asyncio.gather(
+        *(warm_up_model(client, model) for model in models),
+        return_exceptions=True
+    )
+    for model, result in zip(models, results):
+        if isinstance(result, Exception):
+            print(f"Warm-up of {model} failed: {result!r}")
+    print("--------------------------------")
@@ -0,0 +1,133 @@
+import json
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+import api
+import rag_utils
+import warmup
+
+PROMPT = {"prompt": "I want to open a restaurant in Atlanta, Georgia"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(api, "JOBS_DIR", tmp_path / "jobs")
+    monkeypatch.setattr(api, "IDEMPOTENCY_DIR", tmp_path / "idempotency")
+
+    async def no_warm_up(models=None):
+        return None
+
+    async def run_shards(prompt, retrieve=None, progress=None):
+        progress("relevancy_started", {})
+        return {"relevant": ["data/georgia/a.pdf"], "non_relevant": []}
+
+    monkeypatch.setattr(warmup, "warm_up", no_warm_up)
+    monkeypatch.setattr(rag_utils, "run_shards", run_shards)
+    with TestClient(api.app) as client:
+        yield client
+
+
+def wait_for_job(client, job_id):
+    for _ in range(100):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in api.TERMINAL_STATUSES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_relevancy_job_runs_to_completion(client):
+    response = client.post("/api/relevancy", json=PROMPT)
+
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["result"]["relevant"] == ["data/georgia/a.pdf"]
+    assert [e["stage"] for e in job["events"]] == [
+        "started", "relevancy_started", "succeeded"
+    ]
+
+
+def test_idempotency_key_replays_same_job(client):
+    headers = {"Idempotency-Key": "abc"}
+    first = client.post("/api/relevancy", json=PROMPT, headers=headers)
+    second = client.post("/api/relevancy", json=PROMPT, headers=headers)
+
+    assert first.json()["job_id"] == second.json()["job_id"]
+    assert len(list(api.JOBS_DIR.glob("*.json"))) == 1
+
+
+def test_idempotency_key_with_different_body_conflicts(client):
+    headers = {"Idempotency-Key": "abc"}
+    client.post("/api/relevancy", json=PROMPT, headers=headers)
+    response = client.post(
+        "/api/relevancy",
+        json={"prompt": "I want to become a barber in Butte, Montana"},
+        headers=headers
+    )
+
+    assert response.status_code == 409
+
+
+def test_idempotency_key_for_expired_job_conflicts(client):
+    headers = {"Idempotency-Key": "abc"}
+    first = client.post("/api/relevancy", json=PROMPT, headers=headers)
+    wait_for_job(client, first.json()["job_id"])
+    api._job_path(first.json()["job_id"]).unlink()
+
+    response = client.post("/api/relevancy", json=PROMPT, headers=headers)
+
+    assert response.status_code == 409
+
+
+def test_stale_running_job_is_read_as_failed(client):
+    job = {"job_id": "stale", "status": "running", "events": [],
+           "result": None, "error": None}
+    api.write_job(job)
+    record = json.loads(api._job_path("stale").read_text())
+    record["updated"] -= api.STALE_JOB_SECONDS + 1
+    api._job_path("stale").write_text(json.dumps(record))
+
+    job = client.get("/api/jobs/stale").json()
+
+    assert job["status"] == "failed"
+    assert job["events"][-1]["stage"] == "failed"
+
+
+def test_cleanup_expired_deletes_old_records(client, monkeypatch):
+    api.write_job({"job_id": "old", "status": "succeeded", "events": []})
+    api.write_job({"job_id": "new", "status": "succeeded", "events": []})
+    expired = time.time() - api.JOB_TTL_SECONDS - 1
+    os.utime(api._job_path("old"), (expired, expired))
+    monkeypatch.setattr(api, "_last_cleanup", 0.0)
+
+    api.cleanup_expired()
+
+    assert not api._job_path("old").exists()
+    assert api._job_path("new").exists()
+
+
+def test_event_stream_resumes_after_last_event_id(client):
+    api.write_job({
+        "job_id": "done",
+        "status": "succeeded",
+        "events": [
+            {"stage": stage, "data": {}, "time": 0.0}
+            for stage in ("started", "relevancy_started",
+                          "relevancy_finished", "succeeded")
+        ],
+        "result": {"relevant": []},
+        "error": None,
+    })
+
+    response = client.get(
+        "/api/jobs/done/events", headers={"Last-Event-ID": "1"}
+    )
+
+    assert response.status_code == 200
+    ids = [line for line in response.text.splitlines()
+           if line.startswith("id: ")]
+    assert ids == ["id: 2", "id: 3"]
+    assert "event: succeeded" in response.text
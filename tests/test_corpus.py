@@ -0,0 +1,79 @@
+from pathlib import Path
+import pytest
+import corpus
+
+STATE_SHARDS = (
+    "georgia", "montana", "virginia", "west_virginia", "new_york",
+    "indiana", "louisiana", "washington", "district_of_columbia",
+)
+
+
+@pytest.fixture
+def shards(tmp_path):
+    for shard in STATE_SHARDS:
+        (tmp_path / shard / "agency").mkdir(parents=True)
+        (tmp_path / shard / "agency" / f"{shard}.pdf").touch()
+    (tmp_path / "overview.pdf").touch()
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "skip.pdf").touch()
+    return corpus.get_shards([str(tmp_path), str(tmp_path / "missing")])
+
+
+def test_get_shards_recurses_and_keeps_root_files_in_general(shards):
+    assert set(shards) == {*STATE_SHARDS, corpus.GENERAL_SHARD}
+    assert Path(shards["georgia"][0]).parts[-2:] == ("agency", "georgia.pdf")
+    assert Path(shards[corpus.GENERAL_SHARD][0]).name == "overview.pdf"
+
+
+def test_select_shards_by_state_name(shards):
+    selected = corpus.select_shards(
+        shards, "I want to open a restaurant in Atlanta, Georgia"
+    )
+    assert set(selected) == {"georgia", corpus.GENERAL_SHARD}
+
+
+def test_select_shards_by_state_abbreviation(shards):
+    selected = corpus.select_shards(
+        shards, "I want to open a restaurant in Atlanta, GA"
+    )
+    assert set(selected) == {"georgia", corpus.GENERAL_SHARD}
+
+
+def test_select_shards_ignores_abbreviation_outside_location(shards):
+    selected = corpus.select_shards(shards, "I want to run a food truck in LA")
+    assert set(selected) == {corpus.GENERAL_SHARD}
+
+
+def test_select_shards_ignores_all_caps_words(shards):
+    selected = corpus.select_shards(
+        shards, "I WANT TO OPEN A BAR IN ATLANTA, GEORGIA"
+    )
+    assert set(selected) == {"georgia", corpus.GENERAL_SHARD}
+
+
+@pytest.mark.parametrize("location", ["Washington, DC", "Washington D.C."])
+def test_select_shards_washington_dc(shards, location):
+    selected = corpus.select_shards(
+        shards, f"I want to open a restaurant in {location}"
+    )
+    assert set(selected) == {"district_of_columbia", corpus.GENERAL_SHARD}
+
+
+def test_select_shards_prefers_longest_name(shards):
+    selected = corpus.select_shards(
+        shards, "I want to become a barber in Charleston, West Virginia"
+    )
+    assert set(selected) == {"west_virginia", corpus.GENERAL_SHARD}
+
+
+def test_select_shards_multi_word_name(shards):
+    selected = corpus.select_shards(
+        shards, "I want to become a barber in New York City"
+    )
+    assert set(selected) == {"new_york", corpus.GENERAL_SHARD}
+
+
+def test_select_shards_without_match_uses_general_only(shards):
+    prompt = "I want to open a bakery in Paris"
+    assert set(corpus.select_shards(shards, prompt)) == {corpus.GENERAL_SHARD}
+    assert corpus.select_shards(shards, prompt, fallback_to_all=True) == shards
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+import routing
+
+TABLE = "**A** | **B**\n--- | ---\nx | y"
+
+
+@pytest.fixture(autouse=True)
+def fresh_tracker(monkeypatch):
+    monkeypatch.setattr(routing, "LATENCY", routing.LatencyTracker())
+
+
+def make_call(delays: dict[str, float]):
+    async def call(model: str) -> str:
+        await asyncio.sleep(delays[model])
+        return TABLE
+    return call
+
+
+def test_hedge_delay_uses_p95_once_tracker_has_data():
+    policy = routing.RoutingPolicy(mode="hedged", hedge_delay=30.0)
+    call = make_call({"primary": 0.01})
+    assert routing.hedge_delay("primary", policy) == 30.0
+
+    async def run():
+        for _ in range(routing.MIN_SAMPLES):
+            await routing.timed_call("primary", call)
+    asyncio.run(run())
+
+    assert routing.hedge_delay("primary", policy) < 1.0
+
+
+def test_hedged_loser_is_recorded_as_lower_bound_sample():
+    policy = routing.RoutingPolicy(mode="hedged", hedge_delay=0.05)
+    call = make_call({"primary": 0.3, "backup": 0.01})
+
+    async def run():
+        for _ in range(routing.MIN_SAMPLES):
+            output = await routing.route("primary", "backup", call, policy)
+            assert output == TABLE
+    asyncio.run(run())
+
+    snapshot = routing.LATENCY.snapshot()
+    assert snapshot["primary"]["calls"] == routing.MIN_SAMPLES
+    assert snapshot["backup"]["calls"] == routing.MIN_SAMPLES
+    p95 = routing.LATENCY.p95("primary")
+    assert p95 is not None and p95 >= 0.05
+    assert routing.hedge_delay("primary", policy) == p95
+
+
+def test_cancelled_hedge_backup_is_not_recorded():
+    policy = routing.RoutingPolicy(mode="hedged", hedge_delay=0.05)
+    call = make_call({"primary": 0.15, "backup": 5.0})
+
+    output = asyncio.run(routing.route("primary", "backup", call, policy))
+
+    assert output == TABLE
+    snapshot = routing.LATENCY.snapshot()
+    assert snapshot["primary"]["calls"] == 1
+    assert "backup" not in snapshot
+
+
+def test_fallback_timeout_is_recorded_as_sample_and_failure():
+    policy = routing.RoutingPolicy(mode="fallback", deadline=0.05)
+    call = make_call({"primary": 0.3, "backup": 0.01})
+
+    output = asyncio.run(routing.route("primary", "backup", call, policy))
+
+    assert output == TABLE
+    snapshot = routing.LATENCY.snapshot()
+    assert snapshot["primary"]["calls"] == 1
+    assert snapshot["primary"]["failures"] == 1
+    assert routing.LATENCY._latencies["primary"][0] >= 0.05
+
+
+def test_hedged_keeps_first_valid_table():
+    policy = routing.RoutingPolicy(mode="hedged", hedge_delay=0.01)
+
+    async def call(model: str) -> str:
+        if model == "primary":
+            return "no table"
+        await asyncio.sleep(0.01)
+        return TABLE
+
+    assert asyncio.run(
+        routing.route("primary", "backup", call, policy)
+    ) == TABLE
+
+
+def test_first_call_penalty_uses_latest_call_before_median():
+    tracker = routing.LatencyTracker()
+    tracker.record("phi4-mini", 9.0)
+    tracker.record("phi4-mini", 2.0)
+
+    assert tracker.first_call_penalty("phi4-mini") == 7.0
+
+
+def test_first_call_penalty_is_none_with_one_call():
+    tracker = routing.LatencyTracker()
+    tracker.record_warmup("phi4-mini", 4.0)
+    tracker.record("phi4-mini", 1.0)
+
+    snapshot = tracker.snapshot()["phi4-mini"]
+    assert snapshot["first_call_penalty"] is None
+    assert snapshot["warmup"] == 4.0
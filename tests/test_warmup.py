@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+import rag_utils
+import routing
+import warmup
+
+
+@pytest.fixture(autouse=True)
+def fresh_tracker(monkeypatch):
+    monkeypatch.setattr(routing, "LATENCY", routing.LatencyTracker())
+
+
+class FakeAsyncClient:
+    """Records the models loaded and fails for the models in failing."""
+    failing: set[str] = set()
+
+    def __init__(self, host=None):
+        self.loaded = []
+        FakeAsyncClient.instance = self
+
+    async def generate(self, model, prompt, keep_alive):
+        self._load(model)
+
+    async def embed(self, model, input, keep_alive):
+        self._load(model)
+
+    def _load(self, model):
+        if model in self.failing:
+            raise ConnectionError(f"{model} is not pulled")
+        self.loaded.append(model)
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    monkeypatch.setattr(warmup, "AsyncClient", FakeAsyncClient)
+    monkeypatch.setattr(FakeAsyncClient, "failing", set())
+    return FakeAsyncClient
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("-1", -1),
+    ("300", 300),
+    ("1.5", 1.5),
+    ("30m", "30m"),
+])
+def test_parse_keep_alive(value, expected):
+    parsed = rag_utils.parse_keep_alive(value)
+    assert parsed == expected
+    assert type(parsed) is type(expected)
+
+
+def test_warm_up_skips_gemini_and_duplicates(fake_client):
+    asyncio.run(warmup.warm_up([
+        "gemini-2.5-pro", "phi4-mini", rag_utils.EMBED_MODEL, "phi4-mini"
+    ]))
+
+    assert fake_client.instance.loaded == ["phi4-mini", rag_utils.EMBED_MODEL]
+    snapshot = routing.LATENCY.snapshot()
+    assert set(snapshot) == {"phi4-mini", rag_utils.EMBED_MODEL}
+    assert snapshot["phi4-mini"]["warmup"] is not None
+
+
+def test_warm_up_continues_when_a_model_fails(fake_client):
+    fake_client.failing = {"qwen2.5:3b-instruct"}
+
+    asyncio.run(warmup.warm_up(["qwen2.5:3b-instruct", "phi4-mini"]))
+
+    assert fake_client.instance.loaded == ["phi4-mini"]
+    assert "qwen2.5:3b-instruct" not in routing.LATENCY.snapshot()
+
+
+def test_warm_up_default_includes_ollama_report_models():
+    assert "llama3.2:3b" in warmup.WARMUP_MODELS
+    assert rag_utils.EMBED_MODEL in warmup.WARMUP_MODELS
+    assert not any(m.startswith("gemini") for m in warmup.WARMUP_MODELS)